@@ -1,14 +1,26 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-import requests
-from bs4 import BeautifulSoup
+import httpx
+import diskcache
+from cachetools import TTLCache
+from selectolax.lexbor import LexborHTMLParser
 from duckduckgo_search import DDGS
-from math import ceil
+from duckduckgo_search.exceptions import DuckDuckGoSearchException, RatelimitException
+from duckduckgo_search.exceptions import TimeoutException as DDGTimeoutException
+from primp import BodyError as DDGBodyError        # DDGS's HTTP client
+from primp import RequestError as DDGRequestError
+from tenacity import (
+    retry,
+    retry_if_exception,
+    stop_after_attempt,
+    wait_exponential_jitter,
+)
 import re
 import os
-import io
-from functools import lru_cache
+import tempfile
+from functools import wraps
+from dataclasses import dataclass, field
 import asyncio
 
 # ------------------- CONFIG -------------------
@@ -22,95 +34,262 @@ HEADERS = {
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
 }
 
+# Shared clients so TCP/TLS (and DDG's token handshake) are paid once
+_CLIENT = httpx.AsyncClient(
+    http2=True,
+    timeout=10,
+    headers=HEADERS,
+    limits=httpx.Limits(max_keepalive_connections=10, max_connections=20),
+)
+_DDGS = DDGS(timeout=5)
+
+CHAT_LIMIT = 1900              # embed preview length
+
+# Recipe pages are near-static, so results survive restarts for a week
+CACHE_DIR = os.getenv("PAXDEI_CACHE_DIR", ".cache")
+DISK_TTL = 7 * 24 * 3600
+_DISK = diskcache.Cache(CACHE_DIR)
+MEMORY_TTL = 24 * 3600         # bounds memory, not freshness (see DISK_TTL)
+
+
 # ------------------- CACHING -------------------
-@lru_cache(maxsize=128)
-def find_recipe_url(item_name: str) -> str | None:
-    try:
-        ddgs = DDGS()
-        results = ddgs.text(
-            f'site:paxdei.gaming.tools intitle:"Pax Dei Recipe: {item_name}"',
-            max_results=1,
-            timeout=5,
-        )
-        if results:
-            return results[0]["href"]
-    except Exception as e:
-        print(f"[Search] {e}")
-    return None
+_MISSING = object()
+
+
+def async_ttl_cache(maxsize: int = 256, ttl: int = MEMORY_TTL):
+    """TTL cache for coroutines; concurrent identical calls share one task."""
+    def decorator(func):
+        cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        inflight = {}
+
+        def finish(args, task):
+            inflight.pop(args, None)
+            if not task.cancelled() and task.exception() is None:
+                cache[args] = task.result()
+
+        @wraps(func)
+        async def wrapper(*args):
+            result = cache.get(args, _MISSING)
+            if result is not _MISSING:
+                return result
+            task = inflight.get(args)
+            if task is None:
+                task = asyncio.ensure_future(func(*args))
+                inflight[args] = task
+                task.add_done_callback(lambda t: finish(args, t))
+            # shield: one waiter being cancelled must not cancel the others
+            return await asyncio.shield(task)
+
+        return wrapper
+
+    return decorator
+
+
+def disk_cache(expire: int = DISK_TTL):
+    """Persist results on disk; failures raise and are never stored."""
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args):
+            key = (func.__name__, *args)
+            result = _DISK.get(key, _MISSING)
+            if result is not _MISSING:
+                return result
+            result = await func(*args)
+            _DISK.set(key, result, expire=expire)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+# ------------------- FETCHING -------------------
+def _is_transient(e: BaseException) -> bool:
+    # DDGS.text re-raises backend errors as DuckDuckGoSearchException(err),
+    # so a rate limit or timeout arrives wrapped; look at what's inside
+    while (
+        type(e) is DuckDuckGoSearchException
+        and e.args
+        and isinstance(e.args[0], BaseException)
+    ):
+        e = e.args[0]
+    # ... and DDGS._get_url reports network failures as a plain
+    # DuckDuckGoSearchException chained from the HTTP client's error
+    if type(e) is DuckDuckGoSearchException:
+        return isinstance(e.__cause__, (DDGRequestError, DDGBodyError))
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.status_code == 429 or e.response.status_code >= 500
+    return isinstance(e, (httpx.TransportError, RatelimitException, DDGTimeoutException))
+
+
+def _log_retry(state):
+    print(f"[Retry] attempt {state.attempt_number}: {state.outcome.exception()}")
+
+
+_retry = retry(
+    stop=stop_after_attempt(3),
+    wait=wait_exponential_jitter(initial=1, max=8),
+    retry=retry_if_exception(_is_transient),
+    before_sleep=_log_retry,
+    reraise=True,
+)
 
 
-@lru_cache(maxsize=128)
-def scrape_recipe(recipe_url: str):
-    try:
-        r = requests.get(recipe_url, headers=HEADERS, timeout=10)
+@_retry
+async def fetch(method: str, url: str) -> httpx.Response:
+    # 429/5xx raise so they are retried; every other response is returned
+    r = await _CLIENT.request(method, url, follow_redirects=True)
+    if r.status_code == 429 or r.status_code >= 500:
         r.raise_for_status()
-        soup = BeautifulSoup(r.text, "html.parser")
-        text = soup.get_text()
-
-        # Skill & Difficulty
-        m = re.search(r"Skill:\s*([^<>\n]+?)\s*Difficulty:\s*(\d+)", text, re.I)
-        if not m:
-            return None
-        skill, diff = m.group(1).strip(), int(m.group(2))
-
-        # Name
-        name = (
-            soup.find("h1").get_text().replace("Pax Dei Recipe: ", "").strip()
-            if soup.find("h1")
-            else ""
-        )
+    return r
 
-        # Ingredients
-        ingredients = {}
-        for a in soup.find_all("a", href=re.compile(r"/items/|/recipes/")):
-            parent = a.find_parent("strong") or a.find_parent("p")
-            if parent:
-                line = parent.get_text().strip()
-                qty_match = re.match(r"(.+?)\s*x\s*(\d+)", line, re.I)
-                if qty_match:
-                    sub_name = qty_match.group(1).strip()
-                    sub_qty = int(qty_match.group(2))
-                    href = a["href"]
-                    link = BASE_URL + href if href.startswith("/") else href
-                    slug = href.split("/")[-1]
-                    ingredients[sub_name] = {
-                        "qty_per": sub_qty,
-                        "slug": slug,
-                        "link": link,
-                    }
-
-        # Yield
-        yield_per = 1
-        y = re.search(r"yields?\s*(\d+)", text, re.I)
-        if y:
-            yield_per = int(y.group(1))
-
-        return {
-            "name": name,
-            "skill": skill,
-            "diff": diff,
-            "ingredients": ingredients,
-            "yield_per": yield_per,
-            "url": recipe_url,
-        }
-    except Exception as e:
-        print(f"[Scrape] {e}")
-        return None
 
+@_retry
+async def ddg_search(query: str) -> list[dict]:
+    # DDGS is synchronous; keep it off the event loop
+    return await asyncio.to_thread(_DDGS.text, query, max_results=1)
 
-@lru_cache(maxsize=128)
-def get_max_stack(slug: str) -> int:
-    try:
-        r = requests.get(f"{BASE_URL}/items/{slug}", headers=HEADERS, timeout=10)
-        r.raise_for_status()
-        m = re.search(r"Max Stack[:\s]*(\d+)", BeautifulSoup(r.text, "html.parser").get_text(), re.I)
+
+_SLUG_RE = re.compile(r"[^a-z0-9]+")
+
+
+def guess_slug(item_name: str) -> str:
+    # "Staff of Divine II" -> staff_of_divine_ii
+    return _SLUG_RE.sub("_", item_name.lower()).strip("_")
+
+
+@async_ttl_cache()
+@disk_cache()
+async def find_recipe_url(item_name: str) -> str | None:
+    # Most recipes live at the predictable slug, which is far cheaper than a
+    # rate-limited DDG search. Only trust it if it parses as a recipe (404s
+    # and soft 404s don't); the scrape is cached for the caller.
+    guess_url = f"{BASE_URL}/recipes/{guess_slug(item_name)}"
+    if await scrape_recipe(guess_url):
+        return guess_url
+    results = await ddg_search(
+        f'site:paxdei.gaming.tools intitle:"Pax Dei Recipe: {item_name}"'
+    )
+    if results:
+        return results[0]["href"]
+    return None
+
+
+def _find_parent(node, tag: str):
+    # like bs4's find_parent
+    node = node.parent
+    while node is not None:
+        if node.tag == tag:
+            return node
+        node = node.parent
+    return None
+
+
+def _page_text(tree) -> str:
+    return (tree.body or tree.root).text(separator=" ")
+
+
+_SKILL_RE = re.compile(r"Skill:\s*([^<>\n]+?)\s*Difficulty:\s*(\d+)", re.I)
+_YIELD_RE = re.compile(r"yields?\s*(\d+)", re.I)
+_HREF_RE = re.compile(r"/items/|/recipes/")
+_QTY_RE = re.compile(r"(.+?)\s*x\s*(\d+)", re.I)
+_STACK_RE = re.compile(r"Max Stack[:\s]*(\d+)", re.I)
+
+
+def _search_nodes(tree, pattern: re.Pattern):
+    for node in tree.css("p, li"):
+        m = pattern.search(node.text(separator=" "))
         if m:
-            return int(m.group(1))
-    except:
-        pass
+            return m
+    return None
+
+
+def parse_recipe(html: str, recipe_url: str):
+    tree = LexborHTMLParser(html)
+
+    # Skill & Difficulty
+    m = _search_nodes(tree, _SKILL_RE)
+    if not m:
+        return None
+    skill, diff = m.group(1).strip(), int(m.group(2))
+
+    # Name
+    h1 = tree.css_first("h1")
+    name = h1.text().removeprefix("Pax Dei Recipe: ").strip() if h1 else ""
+
+    # Ingredients
+    ingredients = {}
+    # Filter in Python: a selector group would return all /items/ links
+    # before all /recipes/ links instead of document order
+    for a in tree.css("a[href]"):
+        href = a.attributes["href"]
+        if not href or not _HREF_RE.search(href):
+            continue
+        parent = _find_parent(a, "strong") or _find_parent(a, "p")
+        if parent:
+            line = parent.text().strip()
+            qty_match = _QTY_RE.match(line)
+            if qty_match:
+                sub_name = qty_match.group(1).strip()
+                sub_qty = int(qty_match.group(2))
+                link = BASE_URL + href if href.startswith("/") else href
+                slug = href.split("/")[-1]
+                ingredients[sub_name] = {
+                    "qty_per": sub_qty,
+                    "slug": slug,
+                    "link": link,
+                }
+
+    # Yield
+    yield_per = 1
+    y = _search_nodes(tree, _YIELD_RE)
+    if y:
+        yield_per = int(y.group(1))
+
+    return {
+        "name": name,
+        "skill": skill,
+        "diff": diff,
+        "ingredients": ingredients,
+        "yield_per": yield_per,
+        "url": recipe_url,
+    }
+
+
+@async_ttl_cache()
+@disk_cache()
+async def scrape_recipe(recipe_url: str):
+    r = await fetch("GET", recipe_url)
+    if r.status_code == 404:
+        return None
+    r.raise_for_status()
+    return parse_recipe(r.text, recipe_url)
+
+
+@async_ttl_cache()
+@disk_cache()
+async def get_max_stack(slug: str) -> int:
+    r = await fetch("GET", f"{BASE_URL}/items/{slug}")
+    if r.status_code == 404:
+        return 50
+    r.raise_for_status()
+    m = _STACK_RE.search(_page_text(LexborHTMLParser(r.text)))
+    if m:
+        return int(m.group(1))
     return 50
 
 
+async def max_stack_or_default(slug: str) -> int:
+    # A refused item page (e.g. a 403) costs the stack size, not the breakdown
+    try:
+        return await get_max_stack(slug)
+    except httpx.HTTPStatusError as e:
+        if _is_transient(e):
+            raise
+        print(f"[Stack] {slug}: {e}; assuming 50")
+        return 50
+
+
 # ------------------- FAILURE LOGIC -------------------
 def get_fail_multiplier(diff: int, adjusted_level: int) -> float:
     delta = diff - adjusted_level
@@ -123,111 +302,175 @@ def get_fail_multiplier(diff: int, adjusted_level: int) -> float:
     return 1 / (1 - 0.50)       # Hard 50%
 
 
-# ------------------- RECURSIVE RAW CALC -------------------
-def compute_raw(
-    name: str,
-    slug: str,
-    needed_qty: float,
-    level: int,
-    apply_fail: bool = True,
-):
-    url = find_recipe_url(name)
-    if not url:
-        return {slug: needed_qty}
-
-    recipe = scrape_recipe(url)
-    if not recipe:
-        return {slug: needed_qty}
-
-    adj_lvl = level + 1 if apply_fail else 999
-    mult = get_fail_multiplier(recipe["diff"], adj_lvl) if apply_fail else 1.0
-    crafts = ceil(needed_qty / recipe["yield_per"]) * mult
-
-    raw = {}
-    for sub_name, info in recipe["ingredients"].items():
-        sub_needed = info["qty_per"] * crafts
-        sub_raw = compute_raw(sub_name, info["slug"], sub_needed, level, apply_fail)
-        for r_slug, q in sub_raw.items():
-            raw[r_slug] = raw.get(r_slug, 0) + q
-    return raw
-
-
-# ------------------- BREAKDOWN BUILDER -------------------
-def build_breakdown(name: str, needed_qty: float, level: int, stacks_cache: dict):
-    url = find_recipe_url(name)
-    if not url:
-        return ""
-    recipe = scrape_recipe(url)
-    if not recipe:
-        return ""
-
-    crafts = ceil(needed_qty / recipe["yield_per"])
-    bd = f"### 1. [{recipe['name']}]({recipe['url']})\n"
-    bd += f"- **Needed**: `{int(needed_qty)}`\n"
-    inputs = ", ".join(
-        f"{info['qty_per']}x {sub}" for sub, info in recipe["ingredients"].items()
-    )
-    bd += f"- **Batch Craft**: `{inputs} → {recipe['yield_per']}x {recipe['name']}`\n"
-    bd += f"- **Crafts Required**: `ceil({needed_qty} / {recipe['yield_per']}) = {crafts}`\n\n"
-
-    table = "| Raw Resource | Qty | Max Stack | Slots | Method | Link |\n"
-    table += "|--------------|-----|-----------|-------|--------|------|\n"
-    for sub_name, info in sorted(recipe["ingredients"].items(), key=lambda x: x[0]):
-        sub_needed = info["qty_per"] * crafts
-        max_st = stacks_cache.get(info["slug"], get_max_stack(info["slug"]))
-        slots = ceil(sub_needed / max_st)
-        method = "gather" if not find_recipe_url(sub_name) else "craft"
-        table += (
-            f"| [{sub_name}]({info['link']}) | `{int(sub_needed)}` | {max_st} "
-            f"| `{slots}` | {method} | [{sub_name}]({info['link']}) |\n"
+# ------------------- RECIPE GRAPH -------------------
+@dataclass(slots=True)
+class Node:
+    name: str
+    recipe: dict | None = None
+    # (index into the node list, qty per craft, slug, link), sorted by
+    # ingredient name. Slug and link come from this recipe's own page,
+    # since two recipes may link the same ingredient differently.
+    children: list[tuple[int, int, str, str]] = field(default_factory=list)
+
+
+async def resolve_recipe(name: str):
+    url = await find_recipe_url(name)
+    return await scrape_recipe(url) if url else None
+
+
+async def build_graph(root_name: str) -> list[Node]:
+    """Fetch every recipe reachable from ``root_name`` once, root first."""
+    nodes = [Node(root_name)]
+    index = {root_name: 0}
+    frontier = [0]
+    while frontier:
+        recipes = await asyncio.gather(*[resolve_recipe(nodes[i].name) for i in frontier])
+        next_frontier = []
+        for i, recipe in zip(frontier, recipes):
+            node = nodes[i]
+            node.recipe = recipe
+            if not recipe:
+                continue
+            for sub_name, info in sorted(recipe["ingredients"].items(), key=lambda x: x[0]):
+                if sub_name not in index:
+                    index[sub_name] = len(nodes)
+                    nodes.append(Node(sub_name))
+                    next_frontier.append(index[sub_name])
+                node.children.append(
+                    (index[sub_name], info["qty_per"], info["slug"], info["link"])
+                )
+        frontier = next_frontier
+    return nodes
+
+
+async def fetch_stacks(nodes: list[Node]) -> dict:
+    slugs = {slug for node in nodes for _, _, slug, _ in node.children}
+    if nodes[0].recipe is None:
+        slugs.add("")  # the root has no slug of its own
+    slugs = sorted(slugs)
+    return dict(zip(slugs, await asyncio.gather(*[max_stack_or_default(s) for s in slugs])))
+
+
+# ------------------- TREE WALK -------------------
+NOTES = "\n**Subtotal/Bonus Notes**\n\n"
+
+
+def walk(nodes: list[Node], stacks: dict, quantity: int, level: int, emit):
+    """Return ``(orig_raw, adj_raw)``, emitting the breakdown text in order."""
+    # Explicit stack of node visits and text chunks still to emit
+    orig, adj = {}, {}
+    stack = [(0, "", quantity, quantity, frozenset())]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            emit(item)
+            continue
+
+        i, slug, qty_orig, qty_adj, path = item
+        recipe = nodes[i].recipe
+        # An item that is its own ancestor would loop forever; treat it as raw
+        if not recipe or i in path:
+            orig[slug] = orig.get(slug, 0) + qty_orig
+            adj[slug] = adj.get(slug, 0) + qty_adj
+            continue
+
+        mult = get_fail_multiplier(recipe["diff"], level + 1)
+        # -(-a // b) is ceil(a / b) without the float round-trip; orig
+        # quantities stay ints all the way down
+        crafts = -(-qty_orig // recipe["yield_per"])
+        crafts_adj = -(-qty_adj // recipe["yield_per"]) * mult
+
+        inputs = ", ".join(
+            f"{info['qty_per']}x {sub}" for sub, info in recipe["ingredients"].items()
         )
-        bd += build_breakdown(sub_name, sub_needed, level, stacks_cache)
-        bd += "\n**Subtotal/Bonus Notes**\n\n"
-    bd += table + "\n**Subtotal/Bonus Notes**\n\n"
-    return bd
+        emit(f"### 1. [{recipe['name']}]({recipe['url']})\n")
+        emit(f"- **Needed**: `{int(qty_orig)}`\n")
+        emit(f"- **Batch Craft**: `{inputs} → {recipe['yield_per']}x {recipe['name']}`\n")
+        emit(f"- **Crafts Required**: `ceil({qty_orig} / {recipe['yield_per']}) = {crafts}`\n\n")
+
+        table = [
+            "| Raw Resource | Qty | Max Stack | Slots | Method | Link |\n",
+            "|--------------|-----|-----------|-------|--------|------|\n",
+        ]
+        for c, qty_per, sub_slug, link in nodes[i].children:
+            sub = nodes[c]
+            sub_needed = qty_per * crafts
+            max_st = stacks.get(sub_slug, 50)
+            slots = -(-sub_needed // max_st)
+            method = "craft" if sub.recipe else "gather"
+            table.append(
+                f"| [{sub.name}]({link}) | `{int(sub_needed)}` | {max_st} "
+                f"| `{slots}` | {method} | [{sub.name}]({link}) |\n"
+            )
+        table.append(NOTES)
+
+        # Pushed in reverse so each child's subtree and notes come out in
+        # order, followed by this node's table
+        stack.append("".join(table))
+        for c, qty_per, sub_slug, _ in reversed(nodes[i].children):
+            stack.append(NOTES)
+            stack.append((c, sub_slug, qty_per * crafts, qty_per * crafts_adj, path | {i}))
+    return orig, adj
 
 
 # ------------------- MAIN GENERATOR -------------------
-async def generate_breakdown(item_name: str, quantity: int, level: int):
-    # original (no fail) & adjusted (with fail buffer)
-    orig = compute_raw(item_name, "", quantity, level, False)
-    adj = compute_raw(item_name, "", quantity, level, True)
-
-    stacks = {s: get_max_stack(s) for s in set(orig) | set(adj)}
-
-    breakdown = build_breakdown(item_name, quantity, level, stacks)
-
-    slots_orig = sum(ceil(q / stacks.get(s, 50)) for s, q in orig.items())
-    slots_adj = sum(ceil(q / stacks.get(s, 50)) for s, q in adj.items())
-    chests_adj = ceil(slots_adj / 20)
-
-    final_tbl = "| Raw Resource | Qty (Orig) | Qty (Adj) | Slots (Adj) |\n"
-    final_tbl += "|-----|------------|-----------|-------------|\n"
-    for slug in sorted(set(orig) | set(adj)):
+async def generate_breakdown(item_name: str, quantity: int, level: int, out) -> str:
+    # Writes the markdown into ``out`` (owned by the caller); returns the chat preview
+    # Fetch the whole recipe graph and every stack size up front
+    nodes = await build_graph(item_name)
+    stacks = await fetch_stacks(nodes)
+
+    # Stream the document into the file rather than building it as one
+    # string. The chat preview keeps just the first CHAT_LIMIT characters
+    # of the breakdown.
+    chat, chat_len = [], 0
+
+    def write(text: str):
+        out.write(text.encode())
+
+    def emit(chunk: str):
+        nonlocal chat_len
+        write(chunk)
+        if chat_len <= CHAT_LIMIT:
+            chat.append(chunk)
+            chat_len += len(chunk)
+
+    write(f"**{item_name.title()} – Full Recursive Breakdown for {quantity}x (Level {level} +1 Blessing)**\n\n")
+    write("## Step-by-Step Batch & Stack Calculation\n")
+    # original (no fail) & adjusted (with fail buffer) in a single pass
+    orig, adj = walk(nodes, stacks, quantity, level, emit)
+    slugs = sorted(set(orig) | set(adj))
+
+    slots_orig = sum(int(-(-q // stacks.get(s, 50))) for s, q in orig.items())
+    slots_adj = sum(int(-(-q // stacks.get(s, 50))) for s, q in adj.items())
+    chests_adj = -(-slots_adj // 20)
+
+    write("\n\n## Final Gather Totals & Storage Needs\n")
+
+    write("| Raw Resource | Qty (Orig) | Qty (Adj) | Slots (Adj) |\n")
+    write("|-----|------------|-----------|-------------|\n")
+    for slug in slugs:
         qo = int(orig.get(slug, 0))
         qa = int(adj.get(slug, 0))
-        sa = ceil(qa / stacks.get(slug, 50))
+        sa = -(-qa // stacks.get(slug, 50))
         name = slug.replace("_", " ").title()
-        final_tbl += f"| [{name}]({BASE_URL}/items/{slug}) | `{qo}` | `{qa}` | `{sa}` |\n"
+        write(f"| [{name}]({BASE_URL}/items/{slug}) | `{qo}` | `{qa}` | `{sa}` |\n")
     pct = int((slots_adj / slots_orig - 1) * 100) if slots_orig else 0
-    final_tbl += f"**Total Adj: {slots_adj} slots** (+{pct}%)\n"
-
-    md = f"""**{item_name.title()} – Full Recursive Breakdown for {quantity}x (Level {level} +1 Blessing)**
-
-## Step-by-Step Batch & Stack Calculation
-{breakdown}
+    write(f"**Total Adj: {slots_adj} slots** (+{pct}%)\n")
 
-## Final Gather Totals & Storage Needs
-{final_tbl}
+    write(f"""
 
-**Total Raw Slots**: `{slots_orig}` → **~{ceil(slots_orig / 20)} Chests**
+**Total Raw Slots**: `{slots_orig}` → **~{-(-slots_orig // 20)} Chests**
 
 > **Bonus**: Adjusted for failure rates (Very Easy:8%, Easy:15%, Moderate:30%, Hard:50%)  
 > **All math in `code`**  
 > **Verified from paxdei.gaming.tools**
-"""
-    chat = breakdown[:1900] + "..." if len(breakdown) > 1900 else breakdown
-    return md, chat
+""")
+    out.seek(0)
+
+    chat = "".join(chat)
+    chat = chat[:CHAT_LIMIT] + "..." if chat_len > CHAT_LIMIT else chat
+    return chat
 
 
 # ------------------- BOT -------------------
@@ -251,18 +494,22 @@ async def craft(
     """All three parameters are **required**."""
     await interaction.response.defer()
     try:
-        md_full, md_chat = await generate_breakdown(item, quantity, level)
-        embed = discord.Embed(
-            title=f"{item.title()} – {quantity}x (Lvl {level})",
-            description=md_chat,
-            color=0x00ff00,
-        )
-        await interaction.followup.send(embed=embed)
-        file = discord.File(
-            io.StringIO(md_full),
-            filename=f"{item.replace(' ', '_')}_{quantity}x_breakdown.md",
-        )
-        await interaction.followup.send("### Full .md File", file=file)
+        # A real io file: discord.File only accepts io.IOBase objects, which
+        # SpooledTemporaryFile is not before 3.11. discord.File does not
+        # close a passed-in file object, so the with block does.
+        with tempfile.TemporaryFile(mode="w+b") as md_file:
+            md_chat = await generate_breakdown(item, quantity, level, md_file)
+            embed = discord.Embed(
+                title=f"{item.title()} – {quantity}x (Lvl {level})",
+                description=md_chat,
+                color=0x00ff00,
+            )
+            await interaction.followup.send(embed=embed)
+            file = discord.File(
+                md_file,
+                filename=f"{item.replace(' ', '_')}_{quantity}x_breakdown.md",
+            )
+            await interaction.followup.send("### Full .md File", file=file)
     except Exception as e:
         await interaction.followup.send(f"**Error:** `{e}`")
 
@@ -0,0 +1,264 @@
+import asyncio
+import os
+import tempfile
+
+import discord
+import httpx
+from tenacity import wait_none
+
+os.environ.setdefault("DISCORD_TOKEN", "test")
+os.environ.setdefault("PAXDEI_CACHE_DIR", tempfile.mkdtemp())
+
+import craft  # noqa: E402
+
+URL = "https://paxdei.gaming.tools/recipes/plank_crate"
+
+PAGE = """
+<html><body>
+<h1>Pax Dei Recipe: Plank Crate</h1>
+<div>
+  <p>Skill: Carpentry Difficulty: 5</p>
+  <p>This recipe yields 2 Plank Crate.</p>
+  <p><strong><a href="/items/plank">Plank</a> x 4</strong></p>
+  <p><strong><a href="/recipes/iron_ingot">Iron Ingot</a> x 2</strong></p>
+  <p><strong><a href="/items/gem">Gem</a> x 1</strong></p>
+</div>
+<div>
+  <h2>Used in</h2>
+  <ul><li>Crate yields 1. Skill: Woodworking Difficulty: 30</li></ul>
+</div>
+</body></html>
+"""
+
+
+def test_parse_recipe_takes_first_skill_and_yield():
+    recipe = craft.parse_recipe(PAGE, URL)
+    assert recipe["name"] == "Plank Crate"
+    assert recipe["skill"] == "Carpentry"
+    assert recipe["diff"] == 5
+    assert recipe["yield_per"] == 2
+
+
+def test_parse_recipe_without_skill_is_not_a_recipe():
+    assert craft.parse_recipe("<html><body><h1>Log</h1></body></html>", URL) is None
+
+
+def test_parse_recipe_keeps_ingredient_order():
+    recipe = craft.parse_recipe(PAGE, URL)
+    assert list(recipe["ingredients"]) == ["Plank", "Iron Ingot", "Gem"]
+    assert recipe["ingredients"]["Iron Ingot"] == {
+        "qty_per": 2,
+        "slug": "iron_ingot",
+        "link": "https://paxdei.gaming.tools/recipes/iron_ingot",
+    }
+
+
+def test_wrapped_ddg_rate_limit_is_transient():
+    from duckduckgo_search.exceptions import (
+        DuckDuckGoSearchException,
+        RatelimitException,
+    )
+
+    assert craft._is_transient(DuckDuckGoSearchException(RatelimitException("202")))
+    assert not craft._is_transient(DuckDuckGoSearchException("no results"))
+
+
+def test_wrapped_ddg_connect_error_is_transient():
+    import primp
+    from duckduckgo_search.exceptions import DuckDuckGoSearchException
+
+    try:
+        try:
+            raise primp.ConnectError("connection refused")
+        except primp.ConnectError as ex:
+            raise DuckDuckGoSearchException(f"https://www.bing.com ConnectError: {ex}") from ex
+    except DuckDuckGoSearchException as inner:
+        assert craft._is_transient(DuckDuckGoSearchException(inner))
+
+    try:
+        try:
+            raise ValueError("bad json")
+        except ValueError as ex:
+            raise DuckDuckGoSearchException(f"ValueError: {ex}") from ex
+    except DuckDuckGoSearchException as inner:
+        assert not craft._is_transient(DuckDuckGoSearchException(inner))
+
+
+def test_fetch_retries_rate_limits(monkeypatch):
+    statuses = iter([429, 429, 200])
+    client = httpx.AsyncClient(transport=httpx.MockTransport(lambda r: httpx.Response(next(statuses))))
+    monkeypatch.setattr(craft, "_CLIENT", client)
+    monkeypatch.setattr(craft.fetch.retry, "wait", wait_none())
+    r = asyncio.run(craft.fetch("GET", f"{craft.BASE_URL}/items/retry_me"))
+    assert r.status_code == 200
+    assert next(statuses, None) is None
+
+
+def test_refused_item_page_falls_back_to_default_stack(monkeypatch):
+    client = httpx.AsyncClient(transport=httpx.MockTransport(lambda r: httpx.Response(403)))
+    monkeypatch.setattr(craft, "_CLIENT", client)
+    assert asyncio.run(craft.max_stack_or_default("blocked_item")) == 50
+
+
+def _recipe(name, ingredients):
+    return {
+        "name": name,
+        "skill": "Carpentry",
+        "diff": 1,
+        "ingredients": {
+            sub: {"qty_per": qty, "slug": sub.lower(), "link": f"{craft.BASE_URL}/items/{sub.lower()}"}
+            for sub, qty in ingredients.items()
+        },
+        "yield_per": 1,
+        "url": f"{craft.BASE_URL}/recipes/{name.lower()}",
+    }
+
+
+def test_cycle_back_to_root_renders_its_link(monkeypatch):
+    recipes = {"A": _recipe("A", {"B": 1}), "B": _recipe("B", {"A": 2})}
+
+    async def resolve(name):
+        return recipes.get(name)
+
+    monkeypatch.setattr(craft, "resolve_recipe", resolve)
+    nodes = asyncio.run(craft.build_graph("A"))
+
+    text = []
+    orig, _ = craft.walk(nodes, {"a": 10, "b": 10}, 3, 0, text.append)
+    assert orig == {"a": 6}
+    assert "[A]()" not in "".join(text)
+    assert f"[A]({craft.BASE_URL}/items/a)" in "".join(text)
+
+
+def test_rows_use_each_recipes_own_link(monkeypatch):
+    recipes = {
+        "Root": _recipe("Root", {"Nail": 1, "Plank": 1}),
+        "Nail": _recipe("Nail", {"Iron Ingot": 1}),
+        "Plank": _recipe("Plank", {"Iron Ingot": 1}),
+    }
+    recipes["Nail"]["ingredients"]["Iron Ingot"]["link"] = f"{craft.BASE_URL}/recipes/iron_ingot"
+
+    async def resolve(name):
+        return recipes.get(name)
+
+    monkeypatch.setattr(craft, "resolve_recipe", resolve)
+    nodes = asyncio.run(craft.build_graph("Root"))
+    text = []
+    craft.walk(nodes, {}, 1, 0, text.append)
+    text = "".join(text)
+    assert f"[Iron Ingot]({craft.BASE_URL}/recipes/iron_ingot)" in text
+    assert f"[Iron Ingot]({craft.BASE_URL}/items/iron ingot)" in text
+
+
+def test_soft_404_on_guessed_url_falls_back_to_search(monkeypatch):
+    client = httpx.AsyncClient(
+        transport=httpx.MockTransport(lambda r: httpx.Response(200, text="<html><body>Not found</body></html>"))
+    )
+    searched = []
+
+    async def search(query):
+        searched.append(query)
+        return [{"href": f"{craft.BASE_URL}/recipes/soft_404_real"}]
+
+    monkeypatch.setattr(craft, "_CLIENT", client)
+    monkeypatch.setattr(craft, "ddg_search", search)
+    assert asyncio.run(craft.find_recipe_url("Soft 404 Item")) == f"{craft.BASE_URL}/recipes/soft_404_real"
+    assert searched
+
+
+def test_generate_breakdown_writes_markdown_to_file(monkeypatch):
+    recipes = {"Crate": _recipe("Crate", {"Plank": 3})}
+
+    async def resolve(name):
+        return recipes.get(name)
+
+    async def stack(slug):
+        return 20
+
+    monkeypatch.setattr(craft, "resolve_recipe", resolve)
+    monkeypatch.setattr(craft, "max_stack_or_default", stack)
+    with tempfile.TemporaryFile(mode="w+b") as out:
+        chat = asyncio.run(craft.generate_breakdown("Crate", 2, 0, out))
+        file = discord.File(out, filename="crate.md")
+        assert file.fp is out  # used as a file object, not opened as a path
+        md = file.fp.read().decode()
+    assert chat.startswith("### 1. [Crate]")
+    assert "| [Plank](https://paxdei.gaming.tools/items/plank) | `6` |" in md
+    assert md.endswith("**Verified from paxdei.gaming.tools**\n")
+
+
+def test_parse_recipe_reads_skill_outside_main():
+    page = "<html><body><main><h1>Log Pile</h1></main><p>Skill: Forestry Difficulty: 3</p></body></html>"
+    recipe = craft.parse_recipe(page, URL)
+    assert (recipe["skill"], recipe["diff"], recipe["yield_per"]) == ("Forestry", 3, 1)
+
+
+def test_guessed_recipe_url_skips_search(monkeypatch):
+    requests = []
+
+    def handler(request):
+        requests.append(request.method)
+        return httpx.Response(200, text=PAGE)
+
+    async def search(query):
+        raise AssertionError("DDG should not be searched")
+
+    monkeypatch.setattr(craft, "_CLIENT", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(craft, "ddg_search", search)
+    url = asyncio.run(craft.find_recipe_url("Plank Crate Guess"))
+    assert url == f"{craft.BASE_URL}/recipes/plank_crate_guess"
+    assert requests == ["GET"]
+
+
+def test_async_ttl_cache_coalesces_concurrent_calls():
+    calls = []
+
+    @craft.async_ttl_cache()
+    async def slow(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return key * 2
+
+    async def main():
+        return await asyncio.gather(*[slow(21) for _ in range(10)])
+
+    assert asyncio.run(main()) == [42] * 10
+    assert calls == [21]
+
+
+def test_async_ttl_cache_does_not_cache_exceptions():
+    calls = []
+
+    @craft.async_ttl_cache()
+    async def flaky(key):
+        calls.append(key)
+        if len(calls) == 1:
+            raise RuntimeError("transient")
+        return "ok"
+
+    async def main():
+        try:
+            await flaky("k")
+        except RuntimeError:
+            pass
+        return await flaky("k")
+
+    assert asyncio.run(main()) == "ok"
+    assert len(calls) == 2
+
+
+def test_async_ttl_cache_cancelled_waiter_leaves_others_running():
+    @craft.async_ttl_cache()
+    async def slow(key):
+        await asyncio.sleep(0.02)
+        return key
+
+    async def main():
+        first = asyncio.ensure_future(slow("k"))
+        second = asyncio.ensure_future(slow("k"))
+        await asyncio.sleep(0)
+        first.cancel()
+        assert await second == "k"
+        return first.cancelled()
+
+    assert asyncio.run(main())